@@ -16,6 +16,8 @@ class Settings(BaseSettings):
 
     # Analysis tuning
     batch_size: int = 8                       # images per Claude batch call
+    analysis_concurrency: int = 4             # Phase 1 batch calls in flight at once
+    embedding_workers: int = 1                # CLIP encode processes (each holds a model copy)
     max_tokens_per_image: int = 600
     max_tokens_lens_discovery: int = 8000
     max_tokens_annotation_batch: int = 2000   # for 10-drawing annotation batches
@@ -27,6 +29,16 @@ class Settings(BaseSettings):
     doug_images_dir: str = ""       # Directory containing Doug's image files
     db_path: str = "/Users/xieyantong/Projects/drawing-mirror/data/drawing_mirror.db"
     thumbnail_dir: str = "/Users/xieyantong/Projects/drawing-mirror/thumbnails"
+    umap_model_dir: str = "/Users/xieyantong/Projects/drawing-mirror/data/umap_models"
+
+    # CLIP embeddings
+    clip_int8: bool = True             # dynamic int8 quantization of Linear layers (~2-3x on CPU)
+
+    # UMAP projection cache
+    umap_refit_fraction: float = 0.2   # refit instead of transform() once rows grow by this share since the last fit
+
+    # Web
+    cache_static_assets: bool = True   # index built at startup, revalidated by size/mtime per request
 
     model_config = {
         "env_file": str(_ENV_FILE),
@@ -39,3 +51,7 @@ class Settings(BaseSettings):
 @lru_cache()
 def get_settings() -> Settings:
     return Settings()
+
+
+# Materialized once at import for hot paths; get_settings() returns the same object
+settings = get_settings()
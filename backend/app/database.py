@@ -1,9 +1,12 @@
 """SQLite database connection and schema initialization."""
 
+import os
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
 from pathlib import Path
-from app.config import get_settings
+from app.config import settings
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS users (
@@ -31,7 +34,15 @@ CREATE TABLE IF NOT EXISTS drawings (
     UNIQUE(user_id, filename)
 );
 
-CREATE INDEX IF NOT EXISTS idx_drawings_user_date ON drawings(user_id, drawn_date);
+-- (user_id, drawn_date) is a prefix of idx_drawings_user_date_fname below
+DROP INDEX IF EXISTS idx_drawings_user_date;
+-- Narrowest index for per-user COUNT(*) and id-ordered scans (embeddings / UMAP)
+CREATE INDEX IF NOT EXISTS idx_drawings_user ON drawings(user_id, id);
+-- Covers list_drawings: filter + both sort keys + every column the list response reads
+CREATE INDEX IF NOT EXISTS idx_drawings_user_date_fname ON drawings(
+    user_id, drawn_date, filename,
+    filepath, title, file_ext, thumbnail_path, width, height, analyzed_at
+);
 
 CREATE TABLE IF NOT EXISTS archive_analyses (
     id             INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,6 +57,8 @@ CREATE TABLE IF NOT EXISTS archive_analyses (
     completed_at   TEXT
 );
 
+CREATE INDEX IF NOT EXISTS idx_analyses_user_started ON archive_analyses(user_id, started_at);
+
 CREATE TABLE IF NOT EXISTS lenses (
     id                  INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id             INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
@@ -55,6 +68,10 @@ CREATE TABLE IF NOT EXISTS lenses (
     sort_order          INTEGER DEFAULT 0,
     raw_claude_output   TEXT,
     created_at          TEXT NOT NULL DEFAULT (datetime('now')),
+    -- link aggregates, maintained by the trg_ldl_* triggers (see init_db)
+    drawing_count       INTEGER NOT NULL DEFAULT 0,
+    relevant_count      INTEGER NOT NULL DEFAULT 0,   -- relevance_score >= threshold
+    annotation_done     INTEGER NOT NULL DEFAULT 0,   -- ...and annotation IS NOT NULL
     UNIQUE(user_id, name)
 );
 
@@ -80,7 +97,7 @@ CREATE TABLE IF NOT EXISTS reactions (
     reaction_type   TEXT NOT NULL,
     annotation_text TEXT,
     created_at      TEXT NOT NULL DEFAULT (datetime('now'))
-    -- uniqueness enforced at app layer (delete then insert) to handle NULL target_id
+    -- one reaction per (user, drawing, target): see idx_reactions_target
 );
 
 CREATE INDEX IF NOT EXISTS idx_reactions_drawing ON reactions(drawing_id);
@@ -89,7 +106,24 @@ CREATE TABLE IF NOT EXISTS embeddings (
     drawing_id  INTEGER PRIMARY KEY REFERENCES drawings(id) ON DELETE CASCADE,
     vector_blob BLOB NOT NULL,
     model_name  TEXT NOT NULL,
-    created_at  TEXT NOT NULL DEFAULT (datetime('now'))
+    created_at  TEXT NOT NULL DEFAULT (datetime('now')),
+    umap_x      REAL,           -- cached 2-D projection (raw UMAP space)
+    umap_y      REAL
+);
+
+-- Background CLIP encoding state per user: idle | running | complete | error
+CREATE TABLE IF NOT EXISTS embedding_jobs (
+    user_id    INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    status     TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Dataset directory state at the last startup scan, to skip rescanning unchanged dirs
+CREATE TABLE IF NOT EXISTS scan_cache (
+    user_id    INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    dir_mtime  REAL NOT NULL,
+    file_count INTEGER NOT NULL,
+    failed_ids TEXT NOT NULL DEFAULT '[]'   -- JSON drawing ids whose thumbnail/size failed
 );
 
 CREATE TABLE IF NOT EXISTS situated_feedbacks (
@@ -104,34 +138,243 @@ CREATE TABLE IF NOT EXISTS situated_feedbacks (
 """
 
 
+# journal_mode=WAL is persisted in the database file, so it only needs setting once
+_wal_enabled = False
+
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
+    """Per-connection tuning. WAL makes synchronous=NORMAL safe (no fsync per commit)."""
+    global _wal_enabled
+    if not _wal_enabled:
+        conn.execute("PRAGMA journal_mode = WAL")
+        _wal_enabled = True
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA cache_size = -65536")     # 64 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA mmap_size = 1073741824")  # 1 GB of address space; pages shared via the OS cache
+    conn.execute("PRAGMA foreign_keys = ON")
+
+
 def get_db_connection() -> sqlite3.Connection:
     """Open a new SQLite connection. Caller is responsible for closing."""
-    settings = get_settings()
     Path(settings.db_path).parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(settings.db_path)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    conn.execute("PRAGMA journal_mode = WAL")
+    _apply_pragmas(conn)
     return conn
 
 
+# ─── Connection pools ─────────────────────────────────────────────────────────
+# One read-write connection (SQLite allows a single writer at a time anyway) and
+# one read-only connection per CPU. Connections live for the whole process.
+
+_writer_pool: "queue.Queue[sqlite3.Connection] | None" = None
+_reader_pool: "queue.Queue[sqlite3.Connection] | None" = None
+_pool_lock = threading.Lock()
+
+
+def _init_pools() -> None:
+    global _writer_pool, _reader_pool
+    with _pool_lock:
+        if _writer_pool is not None:
+            return
+        Path(settings.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        writers: queue.Queue = queue.Queue()
+        # isolation_level=None: transactions are managed explicitly in get_db()
+        conn = sqlite3.connect(settings.db_path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn)
+        writers.put(conn)
+
+        readers: queue.Queue = queue.Queue()
+        for _ in range(os.cpu_count() or 4):
+            conn = sqlite3.connect(
+                f"file:{settings.db_path}?mode=ro", uri=True, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            _apply_pragmas(conn)
+            readers.put(conn)
+
+        _writer_pool, _reader_pool = writers, readers
+
+
 @contextmanager
-def get_db():
-    """Context manager for use in route handlers."""
-    conn = get_db_connection()
+def get_db(write: bool = False):
+    """
+    Context manager for use in route handlers.
+    Borrows a pooled connection: read-only by default, or the single writer
+    (wrapped in BEGIN IMMEDIATE … COMMIT) when write=True.
+    """
+    if _writer_pool is None:
+        _init_pools()
+
+    pool = _writer_pool if write else _reader_pool
+    conn = pool.get()
+    try:
+        if write:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        else:
+            yield conn
+    finally:
+        pool.put(conn)
+
+
+# ─── Long-running job connections ─────────────────────────────────────────────
+# Background pipelines (archive analysis, lens annotation) hold a connection
+# across many awaits, so they can't borrow the request pools' single writer.
+# They reuse default-mode connections (implicit transactions, db.commit())
+# from this stack instead, keeping each connection's page cache warm.
+
+_job_conns: list[sqlite3.Connection] = []
+_JOB_CONNS_MAX = 4
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a job connection; same semantics as get_db_connection() without the close."""
+    with _pool_lock:
+        conn = _job_conns.pop() if _job_conns else None
+    if conn is None:
+        conn = get_db_connection()
     try:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+        with _pool_lock:
+            if len(_job_conns) < _JOB_CONNS_MAX:
+                _job_conns.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def close_pools() -> None:
+    """Close pooled connections on shutdown (writer runs PRAGMA optimize first)."""
+    global _writer_pool, _reader_pool
+    with _pool_lock:
+        for pool, is_writer in ((_writer_pool, True), (_reader_pool, False)):
+            while pool is not None and not pool.empty():
+                conn = pool.get_nowait()
+                if is_writer:
+                    conn.execute("PRAGMA optimize")
+                conn.close()
+        _writer_pool = _reader_pool = None
+        while _job_conns:
+            _job_conns.pop().close()
+
+
+# Columns added after the first release: {table: {column: declaration}}
+_ADDED_COLUMNS = {
+    "embeddings": {"umap_x": "REAL", "umap_y": "REAL"},
+    "lenses": {
+        "drawing_count": "INTEGER NOT NULL DEFAULT 0",
+        "relevant_count": "INTEGER NOT NULL DEFAULT 0",
+        "annotation_done": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "scan_cache": {"failed_ids": "TEXT NOT NULL DEFAULT '[]'"},
+}
+
+
+def _ensure_columns(conn: sqlite3.Connection) -> None:
+    """Add columns missing from tables created by an older schema (no ADD COLUMN IF NOT EXISTS)."""
+    for table, columns in _ADDED_COLUMNS.items():
+        existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _ensure_reaction_unique_index(conn: sqlite3.Connection) -> None:
+    """
+    One reaction per (user, drawing, target_type, target_id), NULL target_id
+    included via COALESCE. Older DBs enforced this at the app layer, so drop
+    any duplicates (keeping the newest) before the index is first created.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_reactions_target'"
+    ).fetchone()
+    if exists:
+        return
+    conn.execute("""
+        DELETE FROM reactions WHERE id NOT IN (
+            SELECT MAX(id) FROM reactions
+            GROUP BY user_id, drawing_id, target_type, COALESCE(target_id, '')
+        )
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX idx_reactions_target
+        ON reactions(user_id, drawing_id, target_type, COALESCE(target_id, ''))
+    """)
+
+
+def _install_lens_counters(conn: sqlite3.Connection) -> None:
+    """
+    (Re)create the triggers keeping lenses.{drawing_count, relevant_count,
+    annotation_done} in sync with lens_drawing_links, then recompute the
+    counters once. The relevance threshold is baked into the trigger SQL, so
+    both steps run on every startup in case it changed.
+    """
+    t = repr(float(settings.relevance_threshold))
+    relevant = "{r}.relevance_score >= " + t
+    done = "({r}.relevance_score >= " + t + " AND {r}.annotation IS NOT NULL)"
+
+    def bump(row: str, sign: str) -> str:
+        return f"""
+            UPDATE lenses
+            SET drawing_count   = drawing_count {sign} 1,
+                relevant_count  = relevant_count {sign} ({relevant.format(r=row)}),
+                annotation_done = annotation_done {sign} {done.format(r=row)}
+            WHERE id = {row}.lens_id;"""
+
+    conn.executescript(f"""
+        DROP TRIGGER IF EXISTS trg_ldl_insert;
+        DROP TRIGGER IF EXISTS trg_ldl_delete;
+        DROP TRIGGER IF EXISTS trg_ldl_update;
+
+        CREATE TRIGGER trg_ldl_insert AFTER INSERT ON lens_drawing_links
+        BEGIN {bump("NEW", "+")}
+        END;
+
+        CREATE TRIGGER trg_ldl_delete AFTER DELETE ON lens_drawing_links
+        BEGIN {bump("OLD", "-")}
+        END;
+
+        CREATE TRIGGER trg_ldl_update
+        AFTER UPDATE OF lens_id, relevance_score, annotation ON lens_drawing_links
+        BEGIN {bump("OLD", "-")} {bump("NEW", "+")}
+        END;
+
+        UPDATE lenses SET
+            drawing_count   = (SELECT COUNT(*) FROM lens_drawing_links WHERE lens_id = lenses.id),
+            relevant_count  = (SELECT COUNT(*) FROM lens_drawing_links
+                               WHERE lens_id = lenses.id AND {relevant.format(r="lens_drawing_links")}),
+            annotation_done = (SELECT COUNT(*) FROM lens_drawing_links
+                               WHERE lens_id = lenses.id AND {done.format(r="lens_drawing_links")});
+    """)
 
 
 def init_db():
     """Create all tables. Safe to call multiple times (CREATE IF NOT EXISTS)."""
     conn = get_db_connection()
     conn.executescript(SCHEMA_SQL)
+    _ensure_columns(conn)
+    _ensure_reaction_unique_index(conn)
+    _install_lens_counters(conn)
+    # Encoding jobs don't survive a restart
+    conn.execute("UPDATE embedding_jobs SET status = 'idle' WHERE status = 'running'")
     conn.commit()
+    # Walk the largest tables' B-tree pages into the OS page cache (shared with the
+    # mmap'd pool connections) before the first request. NOT INDEXED: a bare
+    # COUNT(*) would only read the narrowest index.
+    for table in ("drawings", "lens_drawing_links", "embeddings"):
+        conn.execute(f"SELECT COUNT(*) FROM {table} NOT INDEXED").fetchone()
     conn.close()
@@ -0,0 +1,24 @@
+"""Conditional GET helpers: version-key ETags and If-None-Match handling."""
+
+import hashlib
+from typing import Optional
+
+from fastapi.responses import Response
+
+
+def make_etag(*version) -> str:
+    """Quoted strong ETag from a cheap version key (e.g. MAX(id), COUNT(*))."""
+    return '"' + hashlib.sha1(repr(version).encode()).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value lists this ETag (weak tags compare equal)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+
+def not_modified(etag: str, cache_control: str = "no-cache") -> Response:
+    return Response(status_code=304, headers={"etag": etag, "cache-control": cache_control})
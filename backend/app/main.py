@@ -1,15 +1,19 @@
 """Drawing Mirror — FastAPI application entry point."""
 
+import asyncio
+import json
+import os
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, ORJSONResponse
 
-from app.config import get_settings
-from app.database import init_db, get_db_connection
+from app.config import settings
+from app.database import init_db, get_db_connection, close_pools
+from app.static_files import CachedStaticFiles
 from app.services.drawing_loader import (
     scan_user_dataset, scan_catalog_dataset,
     generate_thumbnail, get_image_dimensions,
@@ -22,6 +26,120 @@ WEB_DIR = BASE_DIR / "web"
 
 # ─── Startup ──────────────────────────────────────────────────────────────────
 
+def _upsert_user(db, username: str, display_name: str, dataset_path: str) -> int:
+    """Insert the user if new (else refresh dataset_path) and return its id."""
+    row = db.execute("""
+        INSERT INTO users (username, display_name, dataset_path)
+        VALUES (?, ?, ?)
+        ON CONFLICT(username) DO UPDATE SET dataset_path = excluded.dataset_path
+        RETURNING id
+    """, (username, display_name, dataset_path)).fetchone()
+    db.commit()
+    return row['id']
+
+
+def _insert_drawings(db, user_id: int, file_list: list[dict]) -> None:
+    """Insert scanned drawings for a user in one transaction (existing rows are kept)."""
+    rows = [
+        (user_id, d['filename'], d['filepath'], d['drawn_date'], d['title'], d['file_ext'])
+        for d in file_list
+    ]
+    db.execute("BEGIN IMMEDIATE")
+    db.executemany("""
+        INSERT OR IGNORE INTO drawings
+          (user_id, filename, filepath, drawn_date, title, file_ext)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    db.commit()
+
+
+async def _fill_thumbnails_and_dimensions(
+    db, user_id: int, thumb_dir: Path, only_ids: list[int] | None = None
+) -> list[int]:
+    """
+    Generate missing thumbnails and fill in missing dimensions for a user's drawings
+    (or just the drawings in only_ids). PIL work runs in worker threads (bounded by
+    CPU count); results are written back with a single UPDATE statement.
+
+    Returns the ids of drawings whose thumbnail or dimensions failed.
+    """
+    if only_ids is None:
+        rows = db.execute("""
+            SELECT id, filepath, thumbnail_path, width
+            FROM drawings WHERE user_id = ?
+        """, (user_id,)).fetchall()
+    else:
+        rows = db.execute("""
+            SELECT id, filepath, thumbnail_path, width
+            FROM drawings
+            WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (user_id, json.dumps(only_ids))).fetchall()
+
+    # One directory listing instead of a stat() per drawing
+    with os.scandir(thumb_dir) as it:
+        existing_thumbs = {entry.name for entry in it}
+
+    sem = asyncio.Semaphore(os.cpu_count() or 4)
+
+    async def prepare(row, needs_thumb: bool) -> tuple:
+        """Return (thumbnail_path, width, height, id, ok); None where nothing changed."""
+        thumb_path = w = h = None
+        ok = True
+        async with sem:
+            if needs_thumb:
+                path = str(thumb_dir / f"{row['id']}.jpg")
+                try:
+                    await asyncio.to_thread(generate_thumbnail, row['filepath'], path)
+                    thumb_path = path
+                except Exception as e:
+                    print(f"[Startup] Thumbnail failed for {row['filepath']}: {e}")
+                    ok = False
+
+            if not row['width']:
+                # get_image_dimensions reports unreadable files as (0, 0), it doesn't raise
+                w, h = await asyncio.to_thread(get_image_dimensions, row['filepath'])
+                if not w:
+                    print(f"[Startup] Dimensions failed for {row['filepath']}")
+                    w = h = None  # leave width NULL rather than storing 0
+                    ok = False
+        return (thumb_path, w, h, row['id'], ok)
+
+    tasks = []
+    for row in rows:
+        needs_thumb = (
+            not row['thumbnail_path'] or f"{row['id']}.jpg" not in existing_thumbs
+        )
+        if needs_thumb or not row['width']:
+            tasks.append(prepare(row, needs_thumb))
+    if not tasks:
+        return []
+
+    results = await asyncio.gather(*tasks)
+
+    # One UPDATE ... FROM json_each for all rows (SQLite 3.33+), not one per drawing
+    payload = json.dumps([
+        {"id": drawing_id, "tp": tp, "w": w, "h": h}
+        for tp, w, h, drawing_id, _ in results
+    ])
+    db.execute("BEGIN IMMEDIATE")
+    db.execute("""
+        UPDATE drawings
+        SET thumbnail_path = COALESCE(m.tp, drawings.thumbnail_path),
+            width = COALESCE(m.w, drawings.width),
+            height = COALESCE(m.h, drawings.height)
+        FROM (
+            SELECT json_extract(value, '$.id') AS id,
+                   json_extract(value, '$.tp') AS tp,
+                   json_extract(value, '$.w')  AS w,
+                   json_extract(value, '$.h')  AS h
+            FROM json_each(?)
+        ) AS m
+        WHERE drawings.id = m.id
+    """, (payload,))
+    db.commit()
+    return sorted(drawing_id for *_, drawing_id, ok in results if not ok)
+
+
 async def seed_users_and_drawings(settings) -> None:
     """
     On startup: scan dataset_root for user subdirectories.
@@ -33,6 +151,7 @@ async def seed_users_and_drawings(settings) -> None:
         return
 
     db = get_db_connection()
+    db.execute("PRAGMA cache_spill = OFF")   # keep seed transactions in memory until commit
     try:
         for user_dir in sorted(dataset_root.iterdir()):
             if not user_dir.is_dir() or user_dir.name.startswith('.'):
@@ -41,71 +160,52 @@ async def seed_users_and_drawings(settings) -> None:
             username = user_dir.name
             dataset_path = str(user_dir.absolute())
 
-            # Insert user if not exists
-            db.execute("""
-                INSERT OR IGNORE INTO users (username, display_name, dataset_path)
-                VALUES (?, ?, ?)
-            """, (username, username, dataset_path))
-            db.commit()
+            user_id = _upsert_user(db, username, username, dataset_path)
 
-            user_row = db.execute(
-                "SELECT id FROM users WHERE username = ?", (username,)
+            # Skip the full scan if the directory is unchanged since last startup
+            dir_mtime = user_dir.stat().st_mtime
+            with os.scandir(user_dir) as it:
+                file_count = sum(1 for _ in it)
+            thumb_dir = Path(settings.thumbnail_dir) / username
+            thumb_dir.mkdir(parents=True, exist_ok=True)
+            cached = db.execute(
+                "SELECT dir_mtime, file_count, failed_ids FROM scan_cache WHERE user_id = ?",
+                (user_id,),
             ).fetchone()
-            user_id = user_row['id']
+            if cached and cached['dir_mtime'] == dir_mtime and cached['file_count'] == file_count:
+                # Retry only the drawings that failed last time, without a full scan
+                retry_ids = json.loads(cached['failed_ids'])
+                if retry_ids:
+                    failed = await _fill_thumbnails_and_dimensions(
+                        db, user_id, thumb_dir, only_ids=retry_ids
+                    )
+                    db.execute(
+                        "UPDATE scan_cache SET failed_ids = ? WHERE user_id = ?",
+                        (json.dumps(failed), user_id),
+                    )
+                    db.commit()
+                    print(f"[Startup] User '{username}': unchanged since last scan, "
+                          f"retried {len(retry_ids)} failed drawings ({len(failed)} still failing)")
+                else:
+                    print(f"[Startup] User '{username}': unchanged since last scan")
+                continue
 
             # Scan filesystem for drawings
             file_list = scan_user_dataset(dataset_path)
 
             # Insert new drawings
-            for drawing in file_list:
-                db.execute("""
-                    INSERT OR IGNORE INTO drawings
-                      (user_id, filename, filepath, drawn_date, title, file_ext)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    user_id,
-                    drawing['filename'],
-                    drawing['filepath'],
-                    drawing['drawn_date'],
-                    drawing['title'],
-                    drawing['file_ext'],
-                ))
-            db.commit()
+            _insert_drawings(db, user_id, file_list)
 
             # Generate missing thumbnails + update dimensions
-            thumb_dir = Path(settings.thumbnail_dir) / username
-            thumb_dir.mkdir(parents=True, exist_ok=True)
-
-            rows = db.execute("""
-                SELECT id, filepath, thumbnail_path, width
-                FROM drawings WHERE user_id = ?
-            """, (user_id,)).fetchall()
-
-            for row in rows:
-                # Generate thumbnail if missing
-                if not row['thumbnail_path'] or not Path(row['thumbnail_path']).exists():
-                    thumb_path = str(thumb_dir / f"{row['id']}.jpg")
-                    try:
-                        generate_thumbnail(row['filepath'], thumb_path)
-                        db.execute(
-                            "UPDATE drawings SET thumbnail_path = ? WHERE id = ?",
-                            (thumb_path, row['id'])
-                        )
-                    except Exception as e:
-                        print(f"[Startup] Thumbnail failed for {row['filepath']}: {e}")
-
-                # Fill in dimensions if missing
-                if not row['width']:
-                    try:
-                        w, h = get_image_dimensions(row['filepath'])
-                        db.execute(
-                            "UPDATE drawings SET width = ?, height = ? WHERE id = ?",
-                            (w, h, row['id'])
-                        )
-                    except Exception as e:
-                        print(f"[Startup] Dimensions failed for {row['filepath']}: {e}")
+            failed = await _fill_thumbnails_and_dimensions(db, user_id, thumb_dir)
 
+            # Failed drawings are remembered so the next startup retries just those
+            db.execute("""
+                INSERT OR REPLACE INTO scan_cache (user_id, dir_mtime, file_count, failed_ids)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, dir_mtime, file_count, json.dumps(failed)))
             db.commit()
+
             drawing_count = len(file_list)
             print(f"[Startup] User '{username}': {drawing_count} drawings ready")
 
@@ -127,68 +227,20 @@ async def seed_catalog_user(settings, username: str, display_name: str,
         return
 
     db = get_db_connection()
+    db.execute("PRAGMA cache_spill = OFF")   # keep seed transactions in memory until commit
     try:
-        db.execute("""
-            INSERT OR IGNORE INTO users (username, display_name, dataset_path)
-            VALUES (?, ?, ?)
-        """, (username, display_name, images_dir))
-        db.commit()
-
-        user_row = db.execute(
-            "SELECT id FROM users WHERE username = ?", (username,)
-        ).fetchone()
-        user_id = user_row['id']
+        user_id = _upsert_user(db, username, display_name, images_dir)
 
         # Load drawings from catalog
         file_list = scan_catalog_dataset(catalog_path, images_dir)
 
-        for drawing in file_list:
-            db.execute("""
-                INSERT OR IGNORE INTO drawings
-                  (user_id, filename, filepath, drawn_date, title, file_ext)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                drawing['filename'],
-                drawing['filepath'],
-                drawing['drawn_date'],
-                drawing['title'],
-                drawing['file_ext'],
-            ))
-        db.commit()
+        _insert_drawings(db, user_id, file_list)
 
         # Generate thumbnails + dimensions
         thumb_dir = Path(settings.thumbnail_dir) / username
         thumb_dir.mkdir(parents=True, exist_ok=True)
+        await _fill_thumbnails_and_dimensions(db, user_id, thumb_dir)
 
-        rows = db.execute("""
-            SELECT id, filepath, thumbnail_path, width
-            FROM drawings WHERE user_id = ?
-        """, (user_id,)).fetchall()
-
-        for row in rows:
-            if not row['thumbnail_path'] or not Path(row['thumbnail_path']).exists():
-                thumb_path = str(thumb_dir / f"{row['id']}.jpg")
-                try:
-                    generate_thumbnail(row['filepath'], thumb_path)
-                    db.execute(
-                        "UPDATE drawings SET thumbnail_path = ? WHERE id = ?",
-                        (thumb_path, row['id'])
-                    )
-                except Exception as e:
-                    print(f"[Startup] Thumbnail failed for {row['filepath']}: {e}")
-
-            if not row['width']:
-                try:
-                    w, h = get_image_dimensions(row['filepath'])
-                    db.execute(
-                        "UPDATE drawings SET width = ?, height = ? WHERE id = ?",
-                        (w, h, row['id'])
-                    )
-                except Exception as e:
-                    print(f"[Startup] Dimensions failed for {row['filepath']}: {e}")
-
-        db.commit()
         print(f"[Startup] User '{display_name}': {len(file_list)} drawings ready (catalog)")
     finally:
         db.close()
@@ -197,7 +249,6 @@ async def seed_catalog_user(settings, username: str, display_name: str,
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """FastAPI lifespan: init DB and seed data on startup."""
-    settings = get_settings()
     init_db()
     await seed_users_and_drawings(settings)
     # Seed catalog-based users (e.g. Doug)
@@ -209,13 +260,21 @@ async def lifespan(app: FastAPI):
             catalog_path=settings.doug_catalog,
             images_dir=settings.doug_images_dir,
         )
+    if settings.cache_static_assets:
+        static_files.build_index()
     print("[Startup] Drawing Mirror is ready.")
     yield
+    embeddings.shutdown_executor()
+    close_pools()
 
 
 # ─── App ──────────────────────────────────────────────────────────────────────
 
-app = FastAPI(title="Drawing Mirror API", lifespan=lifespan)
+app = FastAPI(
+    title="Drawing Mirror API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -224,8 +283,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Static files
-app.mount("/static", StaticFiles(directory=str(WEB_DIR / "static")), name="static")
+# Static files (index built in lifespan)
+static_files = CachedStaticFiles(directory=str(WEB_DIR / "static"))
+app.mount("/static", static_files, name="static")
 
 # API routers
 app.include_router(users.router,    prefix="/api/users",    tags=["users"])
@@ -238,7 +298,9 @@ app.include_router(embeddings.router,  prefix="/api/embeddings",  tags=["embeddi
 
 # ─── HTML Pages ───────────────────────────────────────────────────────────────
 
+@lru_cache(maxsize=None)
 def _read_template(name: str) -> str:
+    """Templates don't change while the process runs — read each file once."""
     path = WEB_DIR / "templates" / name
     return path.read_text(encoding="utf-8")
 
@@ -1,6 +1,7 @@
 """Archive analysis endpoints: trigger pipeline, check status."""
 
 from fastapi import APIRouter, BackgroundTasks, Query, HTTPException
+from app.config import settings
 from app.database import get_db
 from app.models.schemas import ArchiveStatusResponse, AnalyzeTriggerResponse
 
@@ -18,7 +19,7 @@ async def trigger_analysis(
     """
     from app.services.archive_analyzer import get_archive_analyzer
 
-    with get_db() as db:
+    with get_db(write=True) as db:
         # Check if already running
         running = db.execute("""
             SELECT id FROM archive_analyses
@@ -32,8 +33,6 @@ async def trigger_analysis(
             )
 
         # Create new analysis record
-        from app.config import get_settings
-        settings = get_settings()
         cursor = db.execute("""
             INSERT INTO archive_analyses (user_id, status, model_used)
             VALUES (?, 'pending', ?)
@@ -51,18 +50,22 @@ async def trigger_analysis(
 async def get_status(user_id: int = Query(...)):
     """Get the current archive analysis status for a user."""
     with get_db() as db:
-        # Get most recent analysis
+        # Most recent analysis + whether lenses exist, in one statement
         analysis = db.execute("""
-            SELECT * FROM archive_analyses
-            WHERE user_id = ?
-            ORDER BY started_at DESC
+            SELECT a.*,
+                   (SELECT COUNT(*) FROM lenses WHERE user_id = ?) AS lens_count
+            FROM archive_analyses a
+            WHERE a.user_id = ?
+            ORDER BY a.started_at DESC
             LIMIT 1
-        """, (user_id,)).fetchone()
+        """, (user_id, user_id)).fetchone()
 
-        # Check if lenses exist
-        lens_count = db.execute(
-            "SELECT COUNT(*) as cnt FROM lenses WHERE user_id = ?", (user_id,)
-        ).fetchone()['cnt']
+        if analysis:
+            lens_count = analysis['lens_count']
+        else:
+            lens_count = db.execute(
+                "SELECT COUNT(*) as cnt FROM lenses WHERE user_id = ?", (user_id,)
+            ).fetchone()['cnt']
 
         if not analysis:
             return ArchiveStatusResponse(
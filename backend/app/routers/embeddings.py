@@ -2,47 +2,120 @@
 
 from __future__ import annotations
 
-import threading
-from typing import Any
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
 
 import numpy as np
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 
+from app.config import settings
 from app.database import get_db, get_db_connection
+from app.http_cache import etag_matches, make_etag, not_modified
+from app.routers.drawings import _thumbnail_url
 
 router = APIRouter()
 
-# Track per-user embedding generation state in memory
-# { user_id: "idle" | "running" | "complete" | "error" }
-_status: dict[int, str] = {}
-_lock = threading.Lock()
+
+# ─── Job state (embedding_jobs table, shared by all workers) ──────────────────
+
+def _job_counts(db, user_id: int):
+    """One statement for (total drawings, embedded drawings, job status)."""
+    row = db.execute(
+        """
+        SELECT (SELECT COUNT(*) FROM drawings WHERE user_id = ?) AS total,
+               (SELECT COUNT(*) FROM embeddings e
+                JOIN drawings d ON d.id = e.drawing_id
+                WHERE d.user_id = ?) AS computed,
+               (SELECT status FROM embedding_jobs WHERE user_id = ?) AS status
+        """,
+        (user_id, user_id, user_id),
+    ).fetchone()
+    return row['total'], row['computed'], row['status'] or "idle"
+
+
+def _set_job_status(db, user_id: int, status: str) -> None:
+    db.execute("""
+        INSERT OR REPLACE INTO embedding_jobs (user_id, status, updated_at)
+        VALUES (?, ?, datetime('now'))
+    """, (user_id, status))
 
 
 # ─── Background task ──────────────────────────────────────────────────────────
+# Encoding runs in worker processes that keep CLIP loaded between jobs (and
+# sidestep the GIL for preprocessing). Workers write job status to the DB.
 
-def _run_encode(user_id: int) -> None:
-    """Run CLIP encoding in a background thread (not async — CPU-bound)."""
-    with _lock:
-        _status[user_id] = "running"
+_executor: Optional[ProcessPoolExecutor] = None
 
-    try:
-        from app.services.embeddings import get_embedding_service
 
-        svc = get_embedding_service()
-        db = get_db_connection()
+def _preload_clip() -> None:
+    """Worker initializer: load CLIP once per process."""
+    from app.services.embeddings import get_embedding_service
+    get_embedding_service()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.embedding_workers,
+            mp_context=multiprocessing.get_context("spawn"),  # no forked SQLite/torch state
+            initializer=_preload_clip,
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _run_encode(user_id: int) -> None:
+    """Run CLIP encoding for one user (executes in a worker process)."""
+    db = get_db_connection()
+    try:
         try:
+            from app.services.embeddings import get_embedding_service
+
+            svc = get_embedding_service()
             n = svc.encode_all_user_drawings(user_id, db)
             print(f"[Embeddings] User {user_id}: encoded {n} new drawings")
-        finally:
-            db.close()
-
-        with _lock:
-            _status[user_id] = "complete"
-
-    except Exception as e:
-        print(f"[Embeddings] Error for user {user_id}: {e}")
-        with _lock:
-            _status[user_id] = "error"
+            status = "complete"
+
+        except Exception as e:
+            print(f"[Embeddings] Error for user {user_id}: {e}")
+            db.rollback()
+            status = "error"
+
+        _set_job_status(db, user_id, status)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _on_encode_done(user_id: int, future: Future) -> None:
+    """Mark the job failed if the worker died before recording a status itself."""
+    global _executor
+    if future.cancelled():
+        err: BaseException | str = "cancelled"
+    elif future.exception() is not None:
+        err = future.exception()
+    else:
+        return
+    print(f"[Embeddings] Worker failed for user {user_id}: {err}")
+    if isinstance(err, BrokenProcessPool):
+        _executor = None  # next /generate starts a fresh pool
+
+    db = get_db_connection()
+    try:
+        _set_job_status(db, user_id, "error")
+        db.commit()
+    finally:
+        db.close()
 
 
 # ─── Endpoints ────────────────────────────────────────────────────────────────
@@ -56,37 +129,30 @@ async def generate_embeddings(
     Trigger CLIP embedding generation for all un-embedded drawings of a user.
     Idempotent: if already complete, returns immediately.
     """
-    with _lock:
-        current = _status.get(user_id, "idle")
-
-    if current == "running":
-        return {"status": "running", "message": "Already in progress"}
-
-    # Check if there's anything to do
-    with get_db() as db:
-        total = db.execute(
-            "SELECT COUNT(*) FROM drawings WHERE user_id = ?", (user_id,)
-        ).fetchone()[0]
-        computed = db.execute(
-            """
-            SELECT COUNT(*) FROM embeddings e
-            JOIN drawings d ON d.id = e.drawing_id
-            WHERE d.user_id = ?
-            """,
-            (user_id,),
-        ).fetchone()[0]
+    # Check-and-claim under the writer's BEGIN IMMEDIATE so two workers can't both start
+    with get_db(write=True) as db:
+        total, computed, current = _job_counts(db, user_id)
+        if current == "running":
+            return {"status": "running", "message": "Already in progress"}
 
-    if total > 0 and computed >= total:
-        with _lock:
-            _status[user_id] = "complete"
-        return {"status": "complete", "message": "All embeddings already computed"}
+        if total > 0 and computed >= total:
+            _set_job_status(db, user_id, "complete")
+            return {"status": "complete", "message": "All embeddings already computed"}
 
-    # Launch background thread (CPU-bound, can't use asyncio)
-    with _lock:
-        _status[user_id] = "running"
+        _set_job_status(db, user_id, "running")
 
-    t = threading.Thread(target=_run_encode, args=(user_id,), daemon=True)
-    t.start()
+    # Hand off to the worker pool (CPU-bound, can't use asyncio)
+    global _executor
+    try:
+        future = _get_executor().submit(_run_encode, user_id)
+    except (BrokenProcessPool, RuntimeError) as e:
+        print(f"[Embeddings] Could not start job for user {user_id}: {e}")
+        if isinstance(e, BrokenProcessPool):
+            _executor = None  # next /generate starts a fresh pool
+        with get_db(write=True) as db:
+            _set_job_status(db, user_id, "error")
+        raise HTTPException(status_code=503, detail="Embedding workers unavailable, retry shortly")
+    future.add_done_callback(lambda f: _on_encode_done(user_id, f))
 
     return {"status": "started", "total": total, "computed": computed}
 
@@ -95,43 +161,42 @@ async def generate_embeddings(
 async def get_embedding_status(user_id: int = Query(...)):
     """Return current embedding computation status for a user."""
     with get_db() as db:
-        total = db.execute(
-            "SELECT COUNT(*) FROM drawings WHERE user_id = ?", (user_id,)
-        ).fetchone()[0]
-        computed = db.execute(
-            """
-            SELECT COUNT(*) FROM embeddings e
-            JOIN drawings d ON d.id = e.drawing_id
-            WHERE d.user_id = ?
-            """,
-            (user_id,),
-        ).fetchone()[0]
-
-    with _lock:
-        status = _status.get(user_id, "idle")
+        total, computed, status = _job_counts(db, user_id)
 
     # Auto-promote to complete if all rows present
     if computed >= total > 0 and status != "error":
         status = "complete"
-        with _lock:
-            _status[user_id] = "complete"
 
     return {"status": status, "total": total, "computed": computed}
 
 
-@router.get("/umap")
-async def get_umap(user_id: int = Query(...)):
+@router.get("/umap", response_class=ORJSONResponse)
+async def get_umap(request: Request, user_id: int = Query(...)):
     """
     Compute and return 2-D UMAP projection for all embedded drawings of a user.
+    Answers If-None-Match with 304 while the user's embeddings are unchanged.
 
     Response:
         { "points": [ { drawing_id, x, y, filename, title, drawn_date, thumbnail_url }, ... ] }
     """
     with get_db() as db:
+        version = db.execute(
+            """
+            SELECT COUNT(*), MAX(e.drawing_id), MAX(e.created_at), COUNT(d.thumbnail_path)
+            FROM drawings d
+            JOIN embeddings e ON e.drawing_id = d.id
+            WHERE d.user_id = ?
+            """,
+            (user_id,),
+        ).fetchone()
+        etag = make_etag("umap", user_id, *version)
+        if version[0] and etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+
         rows = db.execute(
             """
             SELECT d.id, d.filename, d.title, d.drawn_date, d.thumbnail_path,
-                   e.vector_blob
+                   e.vector_blob, e.umap_x, e.umap_y
             FROM drawings d
             JOIN embeddings e ON e.drawing_id = d.id
             WHERE d.user_id = ?
@@ -146,34 +211,45 @@ async def get_umap(user_id: int = Query(...)):
             detail="No embeddings found for this user. Run /generate first."
         )
 
-    from app.services.embeddings import EmbeddingService
+    from app.services.embeddings import EmbeddingService, get_embedding_service
 
-    # Stack vectors
-    vecs = np.stack(
-        [EmbeddingService.blob_to_vector(r["vector_blob"]) for r in rows]
+    # Cached projection; NaN marks drawings embedded since the last projection
+    coords = np.array(
+        [(r["umap_x"], r["umap_y"]) for r in rows], dtype=np.float32
     )
+    missing = np.isnan(coords[:, 0])
 
-    # UMAP projection
-    from app.services.embeddings import get_embedding_service
-    svc = get_embedding_service()
-    coords = svc.compute_umap(vecs)  # (N, 2) normalized [0, 1]
+    if missing.any():
+        vecs = EmbeddingService.blobs_to_matrix([r["vector_blob"] for r in rows])
+
+        # UMAP projection: transform() new rows with the cached model, or refit
+        svc = get_embedding_service()
+        coords, refit = svc.project_user(user_id, vecs, coords, missing)
+
+        changed = range(len(rows)) if refit else np.flatnonzero(missing)
+        with get_db(write=True) as db:
+            db.executemany(
+                "UPDATE embeddings SET umap_x = ?, umap_y = ? WHERE drawing_id = ?",
+                [(float(coords[i, 0]), float(coords[i, 1]), rows[i]["id"]) for i in changed],
+            )
+
+    coords = EmbeddingService.normalize_coords(coords)  # (N, 2) normalized [0, 1]
 
-    # Build response
+    # Build response (tolist() converts the whole column to Python floats in C)
+    xs, ys = coords[:, 0].tolist(), coords[:, 1].tolist()
     points: list[dict[str, Any]] = []
-    base = "http://localhost:8000"  # thumbnail URL prefix
     for i, row in enumerate(rows):
-        thumb_url = None
-        if row["thumbnail_path"]:
-            thumb_url = f"{base}/api/drawings/{row['id']}/thumbnail"
+        thumb_url = _thumbnail_url(row["id"]) if row["thumbnail_path"] else None
 
         points.append({
             "drawing_id": row["id"],
-            "x": float(coords[i, 0]),
-            "y": float(coords[i, 1]),
+            "x": xs[i],
+            "y": ys[i],
             "filename": row["filename"],
             "title": row["title"],
             "drawn_date": row["drawn_date"],
             "thumbnail_url": thumb_url,
         })
 
-    return {"points": points}
+    # Returned as a Response so FastAPI skips jsonable_encoder over every point
+    return ORJSONResponse({"points": points}, headers={"etag": etag, "cache-control": "no-cache"})
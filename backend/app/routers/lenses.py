@@ -1,46 +1,51 @@
 """Lens endpoints: list lenses, get drawings for a lens with annotations."""
 
-from fastapi import APIRouter, Query, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Query, HTTPException, BackgroundTasks, Request, Response
 from app.database import get_db
+from app.http_cache import etag_matches, make_etag, not_modified
 from app.models.schemas import (
     LensResponse, LensDrawingsResponse, DrawingWithAnnotation,
     AnnotationStatusResponse
 )
-from app.config import get_settings
+from app.config import settings
 from app.routers.drawings import _thumbnail_url
 
 router = APIRouter()
 
 
 def _row_to_lens(row) -> LensResponse:
-    keys = row.keys()
-    return LensResponse(
+    return LensResponse.model_construct(
         id=row['id'],
         user_id=row['user_id'],
         name=row['name'],
         description=row['description'],
         sort_order=row['sort_order'],
         created_at=row['created_at'],
-        drawing_count=row['drawing_count'] if 'drawing_count' in keys else 0,
-        relevant_count=row['relevant_count'] if 'relevant_count' in keys else 0,
+        drawing_count=row['drawing_count'],
+        relevant_count=row['relevant_count'],
     )
 
 
 @router.get("", response_model=list[LensResponse])
-async def list_lenses(user_id: int = Query(...)):
-    """List all discovered lenses for a user."""
-    settings = get_settings()
+async def list_lenses(request: Request, response: Response, user_id: int = Query(...)):
+    """List all discovered lenses for a user (304 if unchanged since If-None-Match)."""
     with get_db() as db:
+        version = db.execute("""
+            SELECT COUNT(*), MAX(id), SUM(drawing_count), SUM(relevant_count)
+            FROM lenses WHERE user_id = ?
+        """, (user_id,)).fetchone()
+        etag = make_etag("lenses", user_id, *version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        response.headers["etag"] = etag
+        response.headers["cache-control"] = "no-cache"
+
+        # Counts are maintained on the lens row by triggers on lens_drawing_links
         rows = db.execute("""
-            SELECT l.*,
-                   COUNT(ldl.id) as drawing_count,
-                   SUM(CASE WHEN ldl.relevance_score >= ? THEN 1 ELSE 0 END) as relevant_count
-            FROM lenses l
-            LEFT JOIN lens_drawing_links ldl ON ldl.lens_id = l.id
-            WHERE l.user_id = ?
-            GROUP BY l.id
-            ORDER BY l.sort_order ASC
-        """, (settings.relevance_threshold, user_id)).fetchall()
+            SELECT * FROM lenses
+            WHERE user_id = ?
+            ORDER BY sort_order ASC
+        """, (user_id,)).fetchall()
         return [_row_to_lens(r) for r in rows]
 
 
@@ -54,10 +59,8 @@ async def get_lens_drawings(
     Get drawings for a lens, filtered by relevance threshold, ordered chronologically.
     Triggers annotation generation if not yet done.
     """
-    settings = get_settings()
-
     with get_db() as db:
-        # Get lens
+        # Lens row carries its link counts (maintained by triggers)
         lens_row = db.execute(
             "SELECT * FROM lenses WHERE id = ? AND user_id = ?", (lens_id, user_id)
         ).fetchone()
@@ -65,26 +68,7 @@ async def get_lens_drawings(
         if not lens_row:
             raise HTTPException(status_code=404, detail="Lens not found")
 
-        # Get drawing count for lens metadata
-        drawing_count = db.execute(
-            "SELECT COUNT(*) as cnt FROM lens_drawing_links WHERE lens_id = ?", (lens_id,)
-        ).fetchone()['cnt']
-
-        relevant_count = db.execute(
-            "SELECT COUNT(*) as cnt FROM lens_drawing_links WHERE lens_id = ? AND relevance_score >= ?",
-            (lens_id, settings.relevance_threshold)
-        ).fetchone()['cnt']
-
-        lens = LensResponse(
-            id=lens_row['id'],
-            user_id=lens_row['user_id'],
-            name=lens_row['name'],
-            description=lens_row['description'],
-            sort_order=lens_row['sort_order'],
-            created_at=lens_row['created_at'],
-            drawing_count=drawing_count,
-            relevant_count=relevant_count,
-        )
+        lens = _row_to_lens(lens_row)
 
         # Get drawings above threshold, ordered by drawn_date
         rows = db.execute("""
@@ -97,7 +81,7 @@ async def get_lens_drawings(
         """, (lens_id, settings.relevance_threshold)).fetchall()
 
         drawings = [
-            DrawingWithAnnotation(
+            DrawingWithAnnotation.model_construct(
                 id=r['id'],
                 user_id=r['user_id'],
                 filename=r['filename'],
@@ -115,8 +99,7 @@ async def get_lens_drawings(
             for r in rows
         ]
 
-        # Count how many have annotations
-        annotation_done = sum(1 for d in drawings if d.annotation is not None)
+        annotation_done = lens_row['annotation_done']
         annotations_ready = annotation_done == len(drawings) and len(drawings) > 0
 
     # Trigger annotation generation if needed
@@ -146,8 +129,6 @@ async def get_lens_prediction(lens_id: int, user_id: int = Query(...)):
     Cached in memory per (lens_id, user_id) — regenerates on restart.
     """
     from app.services.ai.vision import get_vision_service
-    settings = get_settings()
-
     with get_db() as db:
         lens_row = db.execute(
             "SELECT * FROM lenses WHERE id = ? AND user_id = ?", (lens_id, user_id)
@@ -203,22 +184,11 @@ Write 2–3 sentences. Be concrete and grounded in what you actually observed in
 @router.get("/{lens_id}/annotation_status", response_model=AnnotationStatusResponse)
 async def get_annotation_status(lens_id: int, user_id: int = Query(...)):
     """Poll annotation generation progress for a lens."""
-    settings = get_settings()
-
     with get_db() as db:
-        total = db.execute("""
-            SELECT COUNT(*) as cnt FROM lens_drawing_links ldl
-            JOIN drawings d ON d.id = ldl.drawing_id
-            WHERE ldl.lens_id = ? AND ldl.relevance_score >= ?
-        """, (lens_id, settings.relevance_threshold)).fetchone()['cnt']
-
-        ready = db.execute("""
-            SELECT COUNT(*) as cnt FROM lens_drawing_links ldl
-            JOIN drawings d ON d.id = ldl.drawing_id
-            WHERE ldl.lens_id = ?
-              AND ldl.relevance_score >= ?
-              AND ldl.annotation IS NOT NULL
-        """, (lens_id, settings.relevance_threshold)).fetchone()['cnt']
+        counts = db.execute(
+            "SELECT relevant_count, annotation_done FROM lenses WHERE id = ?", (lens_id,)
+        ).fetchone()
+        total, ready = (counts['relevant_count'], counts['annotation_done']) if counts else (0, 0)
 
     if total == 0:
         status = "empty"
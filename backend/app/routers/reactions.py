@@ -8,7 +8,7 @@ router = APIRouter()
 
 
 def _row_to_reaction(row) -> ReactionResponse:
-    return ReactionResponse(
+    return ReactionResponse.model_construct(
         id=row['id'],
         user_id=row['user_id'],
         drawing_id=row['drawing_id'],
@@ -23,7 +23,7 @@ def _row_to_reaction(row) -> ReactionResponse:
 @router.post("", response_model=ReactionResponse)
 async def create_or_update_reaction(body: ReactionCreate):
     """
-    Create or update a user reaction (INSERT OR REPLACE).
+    Create or update a user reaction (single upsert).
     One reaction per (user, drawing, target_type, target_id).
     """
     valid_reaction_types = {'agree', 'disagree', 'annotate'}
@@ -40,7 +40,7 @@ async def create_or_update_reaction(body: ReactionCreate):
             detail=f"target_type must be one of: {valid_target_types}"
         )
 
-    with get_db() as db:
+    with get_db(write=True) as db:
         # Verify drawing exists
         drawing = db.execute(
             "SELECT id FROM drawings WHERE id = ?", (body.drawing_id,)
@@ -48,24 +48,19 @@ async def create_or_update_reaction(body: ReactionCreate):
         if not drawing:
             raise HTTPException(status_code=404, detail="Drawing not found")
 
-        # Use COALESCE in UNIQUE constraint workaround: delete first, then insert
-        db.execute("""
-            DELETE FROM reactions
-            WHERE user_id = ? AND drawing_id = ? AND target_type = ?
-              AND COALESCE(target_id, '') = COALESCE(?, '')
-        """, (body.user_id, body.drawing_id, body.target_type, body.target_id))
-
-        cursor = db.execute("""
+        # Upsert against idx_reactions_target (COALESCE handles NULL target_id)
+        row = db.execute("""
             INSERT INTO reactions (user_id, drawing_id, target_type, target_id, reaction_type, annotation_text)
             VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, drawing_id, target_type, COALESCE(target_id, ''))
+            DO UPDATE SET reaction_type   = excluded.reaction_type,
+                          annotation_text = excluded.annotation_text,
+                          created_at      = datetime('now')
+            RETURNING *
         """, (
             body.user_id, body.drawing_id, body.target_type,
             body.target_id, body.reaction_type, body.annotation_text
-        ))
-
-        row = db.execute(
-            "SELECT * FROM reactions WHERE id = ?", (cursor.lastrowid,)
-        ).fetchone()
+        )).fetchone()
         return _row_to_reaction(row)
 
 
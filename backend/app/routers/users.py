@@ -8,7 +8,7 @@ router = APIRouter()
 
 
 def _row_to_user(row, drawing_count: int = 0) -> UserResponse:
-    return UserResponse(
+    return UserResponse.model_construct(
         id=row['id'],
         username=row['username'],
         display_name=row['display_name'],
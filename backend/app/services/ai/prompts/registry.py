@@ -1,14 +1,25 @@
 """Prompt registry for Drawing Mirror. Architecture adapted from art-journal."""
 
+import string
 from typing import Optional
 from dataclasses import dataclass, field
 
+_FORMATTER = string.Formatter()
+
 
 @dataclass
 class PromptTemplate:
     id: str
     template: str
     default_values: dict = field(default_factory=dict)
+    # (literal_text, field_name, format_spec, conversion) chunks, parsed once from `template`
+    _parsed: list[tuple[str, Optional[str], str, Optional[str]]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._parsed = [
+            (literal, field_name, format_spec or "", conversion)
+            for literal, field_name, format_spec, conversion in _FORMATTER.parse(self.template)
+        ]
 
 
 class PromptRegistry:
@@ -114,10 +125,21 @@ Return ONLY a valid JSON array, one object per drawing, in the same order:
         variables = dict(template.default_values)
         variables.update(kwargs)
 
-        try:
-            return template.template.format(**variables)
-        except KeyError as e:
-            raise ValueError(f"Missing required variable for template '{template_id}': {e}")
+        # Same semantics as str.format(**variables): {a.b} / {a[0]} lookups,
+        # !r / !s / !a conversions and nested {fields} inside the format spec
+        parts = []
+        for literal, field_name, format_spec, conversion in template._parsed:
+            parts.append(literal)
+            if field_name is not None:
+                try:
+                    value, _ = _FORMATTER.get_field(field_name, (), variables)
+                    if "{" in format_spec:
+                        format_spec = _FORMATTER.vformat(format_spec, (), variables)
+                except (KeyError, IndexError) as e:
+                    raise ValueError(f"Missing required variable for template '{template_id}': {e}")
+                value = _FORMATTER.convert_field(value, conversion)
+                parts.append(format(value, format_spec))
+        return "".join(parts)
 
 
 # ─── Singleton ────────────────────────────────────────────────────────────────
@@ -7,6 +7,31 @@ from typing import Optional
 from app.config import get_settings
 
 
+def _build_image_content(images: list[tuple[bytes, str, str]]) -> list[dict]:
+    """
+    Build the label + base64 image content blocks for a batch.
+    Consumes `images`: each entry is set to None once encoded, so the raw buffer
+    can be freed while the rest of the batch is still being encoded.
+    """
+    content = []
+    for i, (image_data, media_type, identifier) in enumerate(images):
+        images[i] = None
+        content.append({
+            "type": "text",
+            "text": f"[Drawing: {identifier}]"
+        })
+        content.append({
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": media_type,
+                "data": base64.b64encode(image_data).decode("ascii")
+            }
+        })
+        del image_data
+    return content
+
+
 class VisionService:
     """Wrapper for Claude API — image analysis and text synthesis.
 
@@ -31,27 +56,15 @@ class VisionService:
         Claude sees all images before the prompt text.
 
         Args:
-            images: list of (raw_bytes, media_type, label)
+            images: list of (raw_bytes, media_type, label); entries are set to None as they are encoded
             prompt: The analysis prompt sent after all images
             max_tokens: Max response tokens
 
         Returns:
             Claude's full text response
         """
-        content = []
-        for image_data, media_type, identifier in images:
-            content.append({
-                "type": "text",
-                "text": f"[Drawing: {identifier}]"
-            })
-            content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": base64.standard_b64encode(image_data).decode("utf-8")
-                }
-            })
+        # base64 of multi-MB images is CPU-bound — keep it off the event loop
+        content = await asyncio.to_thread(_build_image_content, images)
         content.append({"type": "text", "text": prompt})
 
         message = await self.client.messages.create(
@@ -61,6 +74,30 @@ class VisionService:
         )
         return message.content[0].text
 
+    async def analyze_many(
+        self,
+        batches: list[list[tuple[bytes, str, str]]],
+        prompt: str,
+        max_tokens: int = 4000,
+        concurrency: int = 8
+    ) -> list:
+        """
+        Run analyze_batch for several image batches concurrently, with at most
+        `concurrency` requests in flight, so total time ≈ slowest batch rather
+        than the sum of all of them.
+
+        Returns:
+            One entry per batch, in order: the response text, or the exception
+            that batch raised
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def run(images):
+            async with sem:
+                return await self.analyze_batch(images, prompt, max_tokens)
+
+        return await asyncio.gather(*(run(b) for b in batches), return_exceptions=True)
+
     async def synthesize_text(
         self,
         text: str,
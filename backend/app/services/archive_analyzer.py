@@ -16,10 +16,21 @@ from typing import Optional
 from PIL import Image
 
 from app.config import get_settings
-from app.database import get_db_connection
+from app.database import pooled_connection
 from app.services.ai.vision import get_vision_service
 from app.services.ai.prompts.registry import get_prompt_registry
 
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so except clauses work with either
+try:
+    import orjson  # ~3x faster parse on large lens-discovery responses
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _json_loads, _json_dumps = json.loads, json.dumps
+
 # Claude's base64 image limit is 5MB; base64 overhead is ~33%, so keep originals under ~3.7MB
 _MAX_IMAGE_BYTES = 3_700_000
 
@@ -34,15 +45,59 @@ def _prepare_image_bytes(raw_bytes: bytes, media_type: str) -> tuple[bytes, str]
 
     # Resize: fit within 2048×2048, re-save as JPEG at quality 85
     img = Image.open(io.BytesIO(raw_bytes))
+    if img.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (still ≥ 2048px) instead of full size
+        img.draft("RGB", (2048, 2048))
     img = img.convert("RGB")  # ensure no alpha
     img.thumbnail((2048, 2048), Image.LANCZOS)
     buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=85)
+    # optimize/progressive shave ~10-20% off the bytes at the same quality
+    img.save(buf, format="JPEG", quality=85, optimize=True, progressive=True, subsampling="4:2:0")
     result = buf.getvalue()
     print(f"[Phase1] Resized image from {len(raw_bytes)//1024}KB to {len(result)//1024}KB")
     return result, "image/jpeg"
 
 
+# ─── JSON fallbacks ───────────────────────────────────────────────────────────
+
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+_raw_decoder = json.JSONDecoder()
+
+
+def _extract_json(text: str, opener: str, pattern: re.Pattern):
+    """
+    Pull a JSON value out of text with prose around it. raw_decode from the
+    first opener ignores trailing text without scanning the whole (possibly
+    huge) response; the greedy regex is the last resort. None if neither works.
+    """
+    start = text.find(opener)
+    if start == -1:
+        return None
+    try:
+        return _raw_decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    match = pattern.search(text, start)
+    if match:
+        try:
+            return _json_loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _load_image(d) -> tuple[bytes, str, str]:
+    """Read one drawing's file and prepare it for the API: (bytes, media_type, filename)."""
+    with open(d['filepath'], 'rb') as f:
+        image_bytes = f.read()
+    ext = (d['file_ext'] or 'jpeg').lower()
+    media_type = "image/jpeg" if ext in ('jpg', 'jpeg') else f"image/{ext}"
+    # Resize if too large for Claude's 5MB base64 limit
+    image_bytes, media_type = _prepare_image_bytes(image_bytes, media_type)
+    return image_bytes, media_type, d['filename']
+
+
 class ArchiveAnalyzer:
 
     def __init__(self):
@@ -57,90 +112,87 @@ class ArchiveAnalyzer:
         Main pipeline: Phase 1 (image batches) → Phase 2 (lens discovery).
         Called as a FastAPI BackgroundTask.
         """
-        db = get_db_connection()
-        try:
-            # Count total drawings
-            total = db.execute(
-                "SELECT COUNT(*) as cnt FROM drawings WHERE user_id = ?", (user_id,)
-            ).fetchone()['cnt']
-
-            db.execute("""
-                UPDATE archive_analyses
-                SET status = 'running', phase = 'batch_analysis', total_drawings = ?
-                WHERE id = ?
-            """, (total, analysis_id))
-            db.commit()
-
-            # Phase 1
-            await self._phase1_batch_analysis(db, user_id, analysis_id)
-
-            # Phase 2
-            db.execute("""
-                UPDATE archive_analyses SET phase = 'lens_discovery' WHERE id = ?
-            """, (analysis_id,))
-            db.commit()
-            await self._phase2_lens_discovery(db, user_id, analysis_id)
-
-            db.execute("""
-                UPDATE archive_analyses
-                SET status = 'complete', phase = 'done', completed_at = datetime('now')
-                WHERE id = ?
-            """, (analysis_id,))
-            db.commit()
+        with pooled_connection() as db:
+            try:
+                # Count total drawings
+                total = db.execute(
+                    "SELECT COUNT(*) as cnt FROM drawings WHERE user_id = ?", (user_id,)
+                ).fetchone()['cnt']
 
-        except Exception as e:
-            print(f"[ArchiveAnalyzer] Pipeline failed: {e}")
-            db.execute("""
-                UPDATE archive_analyses
-                SET status = 'failed', error_message = ?
-                WHERE id = ?
-            """, (str(e)[:500], analysis_id))
-            db.commit()
-        finally:
-            db.close()
+                db.execute("""
+                    UPDATE archive_analyses
+                    SET status = 'running', phase = 'batch_analysis', total_drawings = ?
+                    WHERE id = ?
+                """, (total, analysis_id))
+                db.commit()
+
+                # Phase 1
+                await self._phase1_batch_analysis(db, user_id, analysis_id)
+
+                # Phase 2
+                db.execute("""
+                    UPDATE archive_analyses SET phase = 'lens_discovery' WHERE id = ?
+                """, (analysis_id,))
+                db.commit()
+                await self._phase2_lens_discovery(db, user_id, analysis_id)
+
+                db.execute("""
+                    UPDATE archive_analyses
+                    SET status = 'complete', phase = 'done', completed_at = datetime('now')
+                    WHERE id = ?
+                """, (analysis_id,))
+                db.commit()
+
+            except Exception as e:
+                print(f"[ArchiveAnalyzer] Pipeline failed: {e}")
+                db.rollback()  # drop any half-written phase before recording the failure
+                db.execute("""
+                    UPDATE archive_analyses
+                    SET status = 'failed', error_message = ?
+                    WHERE id = ?
+                """, (str(e)[:500], analysis_id))
+                db.commit()
 
     async def generate_lens_annotations(self, lens_id: int, user_id: int) -> None:
         """
         Phase 3 (on-demand): generate per-drawing annotations for a lens.
         Only processes drawings without annotations yet (idempotent).
         """
-        db = get_db_connection()
-        try:
-            # Get lens info
-            lens = db.execute(
-                "SELECT * FROM lenses WHERE id = ? AND user_id = ?", (lens_id, user_id)
-            ).fetchone()
-            if not lens:
-                return
-
-            # Get drawings that need annotation (above threshold, no annotation yet)
-            rows = db.execute("""
-                SELECT d.id, d.filename, d.drawn_date, d.analysis_text
-                FROM lens_drawing_links ldl
-                JOIN drawings d ON d.id = ldl.drawing_id
-                WHERE ldl.lens_id = ?
-                  AND ldl.relevance_score >= ?
-                  AND ldl.annotation IS NULL
-                  AND d.analysis_text IS NOT NULL
-                ORDER BY d.drawn_date ASC, d.filename ASC
-            """, (lens_id, self.settings.relevance_threshold)).fetchall()
-
-            if not rows:
-                return
-
-            # Batch annotate (10 drawings per call)
-            annotation_batch_size = 10
-            for i in range(0, len(rows), annotation_batch_size):
-                batch = rows[i:i + annotation_batch_size]
-                await self._annotate_batch(db, lens, batch)
-                db.commit()
-                if i + annotation_batch_size < len(rows):
-                    await asyncio.sleep(0.5)
+        with pooled_connection() as db:
+            try:
+                # Get lens info
+                lens = db.execute(
+                    "SELECT * FROM lenses WHERE id = ? AND user_id = ?", (lens_id, user_id)
+                ).fetchone()
+                if not lens:
+                    return
+
+                # Get drawings that need annotation (above threshold, no annotation yet)
+                rows = db.execute("""
+                    SELECT d.id, d.filename, d.drawn_date, d.analysis_text
+                    FROM lens_drawing_links ldl
+                    JOIN drawings d ON d.id = ldl.drawing_id
+                    WHERE ldl.lens_id = ?
+                      AND ldl.relevance_score >= ?
+                      AND ldl.annotation IS NULL
+                      AND d.analysis_text IS NOT NULL
+                    ORDER BY d.drawn_date ASC, d.filename ASC
+                """, (lens_id, self.settings.relevance_threshold)).fetchall()
+
+                if not rows:
+                    return
+
+                # Batch annotate (10 drawings per call)
+                annotation_batch_size = 10
+                for i in range(0, len(rows), annotation_batch_size):
+                    batch = rows[i:i + annotation_batch_size]
+                    await self._annotate_batch(db, lens, batch)
+                    db.commit()
+                    if i + annotation_batch_size < len(rows):
+                        await asyncio.sleep(0.5)
 
-        except Exception as e:
-            print(f"[ArchiveAnalyzer] Annotation failed for lens {lens_id}: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                print(f"[ArchiveAnalyzer] Annotation failed for lens {lens_id}: {e}")
 
     # ─── Phase 1: Batch image analysis ───────────────────────────────────────
 
@@ -161,72 +213,110 @@ class ArchiveAnalyzer:
             return
 
         batch_size = self.settings.batch_size
+        concurrency = self.settings.analysis_concurrency
         prompt = self.prompts.render("drawing_batch_analysis")
 
-        for batch_start in range(0, len(drawings), batch_size):
-            batch = drawings[batch_start:batch_start + batch_size]
+        # Each window holds `concurrency` batches whose Claude calls run concurrently.
+        # The next window's images load while the current window's calls are in flight.
+        window_size = batch_size * concurrency
+        window_starts = range(0, len(drawings), window_size)
+        next_load = asyncio.create_task(self._load_window(drawings, 0, window_size))
+        try:
+            for window_start in window_starts:
+                window_end = min(window_start + window_size, len(drawings))
+                loaded = await next_load
+                next_load = None
+                if window_end < len(drawings):
+                    next_load = asyncio.create_task(
+                        self._load_window(drawings, window_end, window_size)
+                    )
+
+                if not loaded:
+                    continue
+
+                await self._analyze_window(db, analysis_id, loaded, window_end, prompt)
+        finally:
+            if next_load is not None:
+                next_load.cancel()
 
-            # Load image bytes
-            image_tuples = []
-            for d in batch:
-                try:
-                    with open(d['filepath'], 'rb') as f:
-                        image_bytes = f.read()
-                    ext = (d['file_ext'] or 'jpeg').lower()
-                    media_type = "image/jpeg" if ext in ('jpg', 'jpeg') else f"image/{ext}"
-                    # Resize if too large for Claude's 5MB base64 limit
-                    image_bytes, media_type = _prepare_image_bytes(image_bytes, media_type)
-                    image_tuples.append((image_bytes, media_type, d['filename']))
-                except Exception as e:
-                    print(f"[Phase1] Could not load {d['filepath']}: {e}")
-
-            if not image_tuples:
-                continue
+    async def _analyze_window(
+        self, db: sqlite3.Connection, analysis_id: int, loaded: list, window_end: int, prompt: str
+    ) -> None:
+        """Run one window's Claude calls and store the per-drawing results."""
+        batch_size = self.settings.batch_size
+        concurrency = self.settings.analysis_concurrency
 
-            # Call Claude
-            max_tokens = len(image_tuples) * self.settings.max_tokens_per_image + 500
-            try:
-                raw_response = await self.vision.analyze_batch(
-                    images=image_tuples,
-                    prompt=prompt,
-                    max_tokens=max_tokens
-                )
-            except Exception as e:
-                print(f"[Phase1] Claude call failed for batch {batch_start}: {e}")
+        # Call Claude
+        max_tokens = (
+            max(len(t) for _, _, t in loaded) * self.settings.max_tokens_per_image + 500
+        )
+        responses = await self.vision.analyze_many(
+            [image_tuples for _, _, image_tuples in loaded],
+            prompt=prompt,
+            max_tokens=max_tokens,
+            concurrency=concurrency
+        )
+
+        hits = []     # (analysis_text, analysis_json, drawing_id)
+        misses = []   # (drawing_id,) — marked as attempted even if no result
+        for (batch_start, batch, image_tuples), raw_response in zip(loaded, responses):
+            if isinstance(raw_response, BaseException):
+                print(f"[Phase1] Claude call failed for batch {batch_start}: {raw_response}")
                 continue
 
             # Parse JSON response
             analyses = self._parse_json_list(raw_response)
             filename_to_analysis = {item.get('filename', ''): item for item in analyses}
 
-            # Store per drawing
             for d in batch:
                 item = filename_to_analysis.get(d['filename'])
                 if item:
-                    analysis_text = item.get('description', '')
-                    db.execute("""
-                        UPDATE drawings
-                        SET analysis_text = ?, analysis_json = ?, analyzed_at = datetime('now')
-                        WHERE id = ?
-                    """, (analysis_text, json.dumps(item), d['id']))
+                    hits.append((item.get('description', ''), _json_dumps(item), d['id']))
                 else:
-                    # Mark as attempted even if no result
-                    db.execute("""
-                        UPDATE drawings SET analyzed_at = datetime('now') WHERE id = ?
-                    """, (d['id'],))
-
-            # Update progress
-            analyzed_so_far = min(batch_start + batch_size, len(drawings))
-            db.execute("""
-                UPDATE archive_analyses SET analyzed_count = ? WHERE id = ?
-            """, (analyzed_so_far, analysis_id))
-            db.commit()
+                    misses.append((d['id'],))
 
             print(f"[Phase1] Batch {batch_start//batch_size + 1}: {len(image_tuples)} images analyzed")
 
-            # Courtesy pause between batches
-            if batch_start + batch_size < len(drawings):
-                await asyncio.sleep(2.0)
+        # Store per drawing + update progress in one transaction
+        db.executemany("""
+            UPDATE drawings
+            SET analysis_text = ?, analysis_json = ?, analyzed_at = datetime('now')
+            WHERE id = ?
+        """, hits)
+        db.executemany("""
+            UPDATE drawings SET analyzed_at = datetime('now') WHERE id = ?
+        """, misses)
+        db.execute("""
+            UPDATE archive_analyses SET analyzed_count = ? WHERE id = ?
+        """, (window_end, analysis_id))
+        db.commit()
+
+    async def _load_window(self, drawings: list, start: int, size: int) -> list:
+        """Load every batch in drawings[start:start + size] → [(batch_start, batch, image_tuples)]."""
+        batch_size = self.settings.batch_size
+        end = min(start + size, len(drawings))
+        batch_starts = range(start, end, batch_size)
+        batches = [drawings[b:min(b + batch_size, end)] for b in batch_starts]
+        # Every file in the window loads concurrently, in threads
+        window_images = await asyncio.gather(*(self._load_batch_images(b) for b in batches))
+        return [
+            (batch_start, batch, image_tuples)
+            for batch_start, batch, image_tuples in zip(batch_starts, batches, window_images)
+            if image_tuples
+        ]
+
+    async def _load_batch_images(self, batch: list) -> list[tuple[bytes, str, str]]:
+        """Read (and shrink if needed) each drawing's image in a thread; skips unreadable files."""
+        results = await asyncio.gather(
+            *(asyncio.to_thread(_load_image, d) for d in batch), return_exceptions=True
+        )
+        image_tuples = []
+        for d, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                print(f"[Phase1] Could not load {d['filepath']}: {result}")
+            else:
+                image_tuples.append(result)
+        return image_tuples
 
     # ─── Phase 2: Lens discovery ──────────────────────────────────────────────
 
@@ -246,11 +336,11 @@ class ArchiveAnalyzer:
             print("[Phase2] No analyzed drawings found, skipping lens discovery")
             return
 
-        # Build summaries block
-        summaries_block = ""
-        for r in rows:
-            date_str = r['drawn_date'] or 'unknown date'
-            summaries_block += f"\n[{date_str}] {r['filename']}: {r['analysis_text']}\n"
+        # Build summaries block (single join: rows can number in the thousands)
+        summaries_block = "".join(
+            f"\n[{r['drawn_date'] or 'unknown date'}] {r['filename']}: {r['analysis_text']}\n"
+            for r in rows
+        )
 
         # Determine year range
         dates = [r['drawn_date'] for r in rows if r['drawn_date']]
@@ -284,37 +374,47 @@ class ArchiveAnalyzer:
         # Build filename → drawing_id map
         filename_to_id = {r['filename']: r['id'] for r in rows}
 
+        lenses = []   # (name, description, drawing_relevance, raw lens JSON)
         for sort_order, lens_data in enumerate(lenses_data):
-            name = lens_data.get('name', f'Lens {sort_order + 1}')
-            description = lens_data.get('description', '')
-            drawing_relevance = lens_data.get('drawing_relevance', {})
-
-            cursor = db.execute("""
-                INSERT OR IGNORE INTO lenses
-                  (user_id, archive_analysis_id, name, description, sort_order, raw_claude_output)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                user_id, analysis_id, name, description,
-                sort_order, json.dumps(lens_data)
+            lenses.append((
+                lens_data.get('name', f'Lens {sort_order + 1}'),
+                lens_data.get('description', ''),
+                {fn: float(score) for fn, score in lens_data.get('drawing_relevance', {}).items()},
+                _json_dumps(lens_data),
             ))
 
-            # If already exists (IGNORE), fetch it
-            lens_row = db.execute(
-                "SELECT id FROM lenses WHERE user_id = ? AND name = ?", (user_id, name)
-            ).fetchone()
-            lens_id = lens_row['id']
-
-            # Store relevance scores for ALL drawings
-            for filename, score in drawing_relevance.items():
-                drawing_id = filename_to_id.get(filename)
-                if drawing_id is not None:
-                    db.execute("""
-                        INSERT OR IGNORE INTO lens_drawing_links
-                          (lens_id, drawing_id, relevance_score)
-                        VALUES (?, ?, ?)
-                    """, (lens_id, drawing_id, float(score)))
-
-            db.commit()
+        # All lenses and their links go in as two executemany calls, one transaction
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("""
+            INSERT OR IGNORE INTO lenses
+              (user_id, archive_analysis_id, name, description, sort_order, raw_claude_output)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (user_id, analysis_id, name, description, sort_order, raw)
+            for sort_order, (name, description, _, raw) in enumerate(lenses)
+        ])
+
+        # Resolve ids by name (covers lenses that already existed and were IGNOREd)
+        name_to_lens_id = {
+            r['name']: r['id']
+            for r in db.execute("SELECT id, name FROM lenses WHERE user_id = ?", (user_id,))
+        }
+
+        # Store relevance scores for ALL drawings
+        links = [
+            (name_to_lens_id[name], filename_to_id[filename], score)
+            for name, _, drawing_relevance, _ in lenses
+            for filename, score in drawing_relevance.items()
+            if filename in filename_to_id
+        ]
+        db.executemany("""
+            INSERT OR IGNORE INTO lens_drawing_links
+              (lens_id, drawing_id, relevance_score)
+            VALUES (?, ?, ?)
+        """, links)
+        db.commit()
+
+        for name, _, drawing_relevance, _ in lenses:
             print(f"[Phase2] Lens '{name}' stored with {len(drawing_relevance)} scores")
 
     # ─── Phase 3: Lens annotation batch ──────────────────────────────────────
@@ -349,14 +449,16 @@ class ArchiveAnalyzer:
         annotations = self._parse_json_list(raw_response)
         filename_to_annotation = {item.get('filename', ''): item.get('annotation', '') for item in annotations}
 
-        for d in batch:
-            annotation = filename_to_annotation.get(d['filename'])
-            if annotation:
-                db.execute("""
-                    UPDATE lens_drawing_links
-                    SET annotation = ?, annotation_generated_at = datetime('now')
-                    WHERE lens_id = ? AND drawing_id = ?
-                """, (annotation, lens['id'], d['id']))
+        updates = [
+            (filename_to_annotation[d['filename']], lens['id'], d['id'])
+            for d in batch
+            if filename_to_annotation.get(d['filename'])
+        ]
+        db.executemany("""
+            UPDATE lens_drawing_links
+            SET annotation = ?, annotation_generated_at = datetime('now')
+            WHERE lens_id = ? AND drawing_id = ?
+        """, updates)
 
     # ─── JSON parsing utilities ───────────────────────────────────────────────
 
@@ -365,27 +467,22 @@ class ArchiveAnalyzer:
         text = text.strip()
         if text.startswith("```"):
             text = text[text.find('\n') + 1:]
-        if text.endswith("```"):
-            text = text[:text.rfind("```")]
-        return text.strip()
+        return text.removesuffix("```").strip()
 
     def _parse_json_list(self, text: str) -> list:
         """Parse Claude's response as a JSON array."""
         text = self._strip_markdown_fences(text)
         try:
-            result = json.loads(text)
+            result = _json_loads(text)
             if isinstance(result, list):
                 return result
         except json.JSONDecodeError:
             pass
 
-        # Fallback: try to extract array with regex
-        match = re.search(r'\[.*\]', text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
+        # Fallback: array embedded in surrounding prose
+        result = _extract_json(text, "[", _JSON_ARRAY_RE)
+        if result is not None:
+            return result
 
         print(f"[JSON] Failed to parse list from: {text[:300]}")
         return []
@@ -394,19 +491,16 @@ class ArchiveAnalyzer:
         """Parse Claude's response as a JSON object."""
         text = self._strip_markdown_fences(text)
         try:
-            result = json.loads(text)
+            result = _json_loads(text)
             if isinstance(result, dict):
                 return result
         except json.JSONDecodeError:
             pass
 
-        # Fallback: try to extract object with regex
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
+        # Fallback: object embedded in surrounding prose
+        result = _extract_json(text, "{", _JSON_OBJECT_RE)
+        if result is not None:
+            return result
 
         print(f"[JSON] Failed to parse dict from: {text[:300]}")
         return {}
@@ -1,5 +1,6 @@
 """Drawing file loader: filename parsing, filesystem scanning, thumbnail generation."""
 
+import os
 import re
 from pathlib import Path
 from PIL import Image, ExifTags
@@ -28,8 +29,16 @@ FILENAME_PATTERN = re.compile(
     re.IGNORECASE
 )
 
+# Extensions FILENAME_PATTERN accepts (lowercased, no dot)
+_PATTERN_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
 SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 
+# EXIF Orientation tag id (0x0112), resolved once instead of scanning ExifTags.TAGS per image
+_ORIENTATION_TAG = next(
+    (tag_id for tag_id, name in ExifTags.TAGS.items() if name == 'Orientation'), 0x0112
+)
+
 
 def parse_filename(filename: str) -> dict:
     """
@@ -43,6 +52,22 @@ def parse_filename(filename: str) -> dict:
       "2021-07-16.JPG"
         -> {drawn_date: "2021-07-16", title: None, file_ext: "jpg"}
     """
+    # Fast path for the usual YYYY-MM-DD[-title].ext shape: plain slicing gives
+    # exactly what FILENAME_PATTERN would; anything unusual goes to the regex.
+    if len(filename) >= 14 and filename[4] == '-' and filename[7] == '-':
+        dot = filename.rfind('.')
+        ext = filename[dot + 1:].lower()
+        if (
+            ext in _PATTERN_EXTENSIONS
+            and filename[:4].isdecimal() and filename[5:7].isdecimal()
+            and filename[8:10].isdecimal()
+        ):
+            if filename[10] == '.' and dot == 10:
+                return {'drawn_date': filename[:10], 'title': None, 'file_ext': ext}
+            title = filename[11:dot]
+            if filename[10] == '-' and title and '\n' not in title:
+                return {'drawn_date': filename[:10], 'title': title, 'file_ext': ext}
+
     match = FILENAME_PATTERN.match(filename)
     if match:
         return {
@@ -61,14 +86,11 @@ def get_image_dimensions(filepath: str) -> tuple[int, int]:
     try:
         with Image.open(filepath) as img:
             try:
-                exif = img._getexif()
-                if exif:
-                    for tag, val in exif.items():
-                        if ExifTags.TAGS.get(tag) == 'Orientation':
-                            if val in (6, 8):  # 90 or 270 degrees
-                                return img.size[1], img.size[0]
-            except (AttributeError, KeyError):
-                pass
+                orientation_value = img.getexif().get(_ORIENTATION_TAG)
+            except (AttributeError, KeyError, IndexError, ValueError):
+                orientation_value = None  # unreadable EXIF: report the stored size
+            if orientation_value in (6, 8):  # 90 or 270 degrees
+                return img.size[1], img.size[0]
             return img.size  # (width, height)
     except Exception:
         return (0, 0)
@@ -89,27 +111,23 @@ def generate_thumbnail(
     Path(dest_path).parent.mkdir(parents=True, exist_ok=True)
 
     with Image.open(source_path) as img:
+        if img.format == "JPEG":
+            # DCT-domain downscale while decoding. Square box so EXIF rotation can't
+            # undershoot; 2x so thumbnail() still gets its reducing_gap=2.0 headroom
+            side = 2 * max(size)
+            img.draft("RGB", (side, side))
+
         # Handle EXIF rotation
         try:
-            from PIL import ExifTags
-            orientation_tag = None
-            for tag_id, tag_name in ExifTags.TAGS.items():
-                if tag_name == 'Orientation':
-                    orientation_tag = tag_id
-                    break
-
-            if orientation_tag:
-                exif = img._getexif()
-                if exif is not None:
-                    orientation_value = exif.get(orientation_tag)
-                    if orientation_value == 3:
-                        img = img.rotate(180, expand=True)
-                    elif orientation_value == 6:
-                        img = img.rotate(270, expand=True)
-                    elif orientation_value == 8:
-                        img = img.rotate(90, expand=True)
-        except (AttributeError, KeyError, IndexError):
-            pass
+            orientation_value = img.getexif().get(_ORIENTATION_TAG)
+        except (AttributeError, KeyError, IndexError, ValueError):
+            orientation_value = None  # unreadable EXIF: leave as stored
+        if orientation_value == 3:
+            img = img.rotate(180, expand=True)
+        elif orientation_value == 6:
+            img = img.rotate(270, expand=True)
+        elif orientation_value == 8:
+            img = img.rotate(90, expand=True)
 
         # Convert to RGB (handles RGBA, P mode images)
         if img.mode in ('RGBA', 'P'):
@@ -128,22 +146,26 @@ def scan_user_dataset(dataset_path: str) -> list[dict]:
     Does NOT touch the database.
     """
     results = []
-    p = Path(dataset_path)
-
-    if not p.exists() or not p.is_dir():
+    if not os.path.isdir(dataset_path):
         return results
 
-    for file in sorted(p.iterdir()):
-        if not file.is_file():
-            continue
-        if file.suffix.lower() not in SUPPORTED_EXTENSIONS:
-            continue
-        if file.name.startswith('.'):  # skip .DS_Store etc
-            continue
-
-        meta = parse_filename(file.name)
-        meta['filename'] = file.name
-        meta['filepath'] = str(file.absolute())
+    # scandir: names and file types come from the directory listing itself, and
+    # entry.path is already absolute because the directory path is
+    with os.scandir(os.path.abspath(dataset_path)) as it:
+        entries = sorted(
+            (
+                e for e in it
+                if not e.name.startswith('.')  # skip .DS_Store etc
+                and os.path.splitext(e.name)[1].lower() in SUPPORTED_EXTENSIONS
+                and e.is_file()
+            ),
+            key=lambda e: e.name,
+        )
+
+    for entry in entries:
+        meta = parse_filename(entry.name)
+        meta['filename'] = entry.name
+        meta['filepath'] = entry.path
         results.append(meta)
 
     return results
@@ -163,18 +185,29 @@ def scan_catalog_dataset(catalog_path: str, images_dir: str) -> list[dict]:
     except ImportError:
         raise RuntimeError("openpyxl is required for catalog datasets: pip3 install openpyxl")
 
-    wb = openpyxl.load_workbook(catalog_path)
-    ws = wb.active
+    # read_only streams the sheet XML; data_only returns cached values instead of formulas
+    wb = openpyxl.load_workbook(catalog_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()  # stored <dimension> can be stale; read rows until the XML ends
+        rows = list(ws.iter_rows(values_only=True))
+    finally:
+        wb.close()  # read-only workbooks keep the file open until closed
+    if not rows:
+        return []
+
+    # Build column index from header row (read-only sheets may not know max_column)
+    col = {h: i for i, h in enumerate(rows[0]) if h}
 
-    # Build column index from header row
-    headers = [ws.cell(1, c).value for c in range(1, ws.max_column + 1)]
-    col = {h: i + 1 for i, h in enumerate(headers) if h}
+    def cell(row: tuple, header: str):
+        i = col.get(header)
+        return row[i] if i is not None and i < len(row) else None
 
     images_p = Path(images_dir)
     results = []
 
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        filename = row[col['Image File'] - 1] if 'Image File' in col else None
+    for row in rows[1:]:
+        filename = cell(row, 'Image File')
         if not filename:
             continue
 
@@ -182,12 +215,11 @@ def scan_catalog_dataset(catalog_path: str, images_dir: str) -> list[dict]:
         if not filepath.exists():
             continue  # skip catalog entries without a matching image file
 
-        raw_date = row[col['Date'] - 1] if 'Date' in col else None
-        title = row[col['Title'] - 1] if 'Title' in col else None
-        medium = row[col['Medium'] - 1] if 'Medium' in col else None
-        location = row[col['Location'] - 1] if 'Location' in col else None
-        description = row[col.get('Description (per PDF context)', 'Description') - 1] \
-            if col.get('Description (per PDF context)') or col.get('Description') else None
+        raw_date = cell(row, 'Date')
+        title = cell(row, 'Title')
+        medium = cell(row, 'Medium')
+        location = cell(row, 'Location')
+        description = cell(row, 'Description (per PDF context)') or cell(row, 'Description')
 
         ext = Path(filename).suffix.lstrip('.').lower()
 
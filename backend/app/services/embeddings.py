@@ -3,10 +3,24 @@
 from __future__ import annotations
 
 import io
+import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+# Images per CLIP forward pass (and per embeddings-table commit)
+_ENCODE_BATCH_SIZE = 32
+
+# Embeddings are stored as float16 (1 KB per 512-dim row). Rows written before
+# that are float32 (2 KB); readers tell them apart by blob length, and the
+# model_name column carries a "/fp16" suffix for the new rows.
+_BLOB_DTYPE = np.float16
+
+
+def _blob_dtype(blob: bytes, dim: int):
+    return np.float16 if len(blob) == dim * 2 else np.float32
+
 
 class EmbeddingService:
     """
@@ -27,42 +41,96 @@ class EmbeddingService:
         )
         self._model.eval()
         self._torch = torch
-        print("[Embeddings] CLIP ViT-B/32 loaded (CPU)")
+        self._loader_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4))
+        # Recorded per row in embeddings.model_name
+        self.model_name = "ViT-B-32/openai"
+
+        from app.config import settings
+        if settings.clip_int8:
+            try:
+                # int8 GEMMs (VNNI/AMX on x86, qnnpack on ARM); cosine drift vs fp32 is ~1%
+                self._model = torch.ao.quantization.quantize_dynamic(
+                    self._model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                self.model_name += "/int8"
+            except Exception as e:
+                print(f"[Embeddings] int8 quantization unavailable, using fp32: {e}")
+
+        self.model_name += "/fp16"   # storage precision, see _BLOB_DTYPE
+
+        print(f"[Embeddings] CLIP ViT-B/32 loaded (CPU, {self.model_name})")
 
     def encode_image(self, filepath: str) -> np.ndarray:
         """
         Encode a single image file to a 512-dim float32 L2-normalized vector.
         Returns zero vector if file can't be opened.
         """
+        return self.encode_image_batch([filepath])[0]
+
+    def _load_tensor(self, filepath: str):
+        """Open + preprocess one image to a (3, 224, 224) tensor; None if unreadable."""
         from PIL import Image
 
         try:
             with Image.open(filepath) as img:
-                img_rgb = img.convert("RGB")
-                tensor = self._preprocess(img_rgb).unsqueeze(0).to(self._device)
+                return self._preprocess(img.convert("RGB"))
         except Exception as e:
             print(f"[Embeddings] Failed to open {filepath}: {e}")
-            return np.zeros(512, dtype=np.float32)
+            return None
 
-        with self._torch.no_grad():
-            features = self._model.encode_image(tensor)
+    def _submit_loads(self, filepaths: list[str]) -> list:
+        """Start decoding/preprocessing images in the loader threads (PIL releases the GIL)."""
+        return [self._loader_pool.submit(self._load_tensor, fp) for fp in filepaths]
+
+    def _encode_tensors(self, tensors: list) -> np.ndarray:
+        """One forward pass over preprocessed tensors → (N, 512); None entries get zero rows."""
+        out = np.zeros((len(tensors), 512), dtype=np.float32)
+        ok = [i for i, t in enumerate(tensors) if t is not None]
+        if not ok:
+            return out
+
+        torch = self._torch
+        batch = torch.stack([tensors[i] for i in ok]).to(self._device)
+        with torch.inference_mode():
+            features = self._model.encode_image(batch)
             features = features / features.norm(dim=-1, keepdim=True)
-        return features.cpu().numpy()[0].astype(np.float32)
+        out[ok] = features.cpu().numpy().astype(np.float32)
+        return out
+
+    def encode_image_batch(self, filepaths: list[str]) -> np.ndarray:
+        """
+        Encode image files to an (N, 512) float32 matrix of L2-normalized rows in
+        one forward pass. Unreadable files get zero rows.
+        """
+        return self._encode_tensors([f.result() for f in self._submit_loads(filepaths)])
 
     @staticmethod
     def vector_to_blob(vec: np.ndarray) -> bytes:
-        """Serialize numpy float32 array to raw bytes for SQLite storage."""
-        return vec.astype(np.float32).tobytes()
+        """Serialize a vector to raw float16 bytes for SQLite storage."""
+        return vec.astype(_BLOB_DTYPE).tobytes()
 
     @staticmethod
-    def blob_to_vector(blob: bytes) -> np.ndarray:
-        """Deserialize raw bytes from SQLite to numpy float32 array."""
-        return np.frombuffer(blob, dtype=np.float32).copy()
+    def blob_to_vector(blob: bytes, dim: int = 512) -> np.ndarray:
+        """Deserialize raw bytes from SQLite (float16 or legacy float32) to a float32 array."""
+        return np.frombuffer(blob, dtype=_blob_dtype(blob, dim)).astype(np.float32)
+
+    @staticmethod
+    def blobs_to_matrix(blobs: list[bytes], dim: int = 512) -> np.ndarray:
+        """
+        Deserialize N blobs straight into one preallocated, writable (N, dim)
+        float32 matrix (no per-row arrays, no joined temporary). float16 and
+        legacy float32 rows can be mixed; each is upcast on assignment.
+        """
+        matrix = np.empty((len(blobs), dim), dtype=np.float32)
+        for i, blob in enumerate(blobs):
+            matrix[i] = np.frombuffer(blob, dtype=_blob_dtype(blob, dim))
+        return matrix
 
     def encode_all_user_drawings(self, user_id: int, db) -> int:
         """
-        Encode all drawings for a user that don't yet have embeddings.
-        Stores each embedding as a BLOB in the embeddings table.
+        Encode all drawings for a user that don't yet have embeddings, in
+        batches of _ENCODE_BATCH_SIZE. Stores each embedding as a BLOB in the
+        embeddings table.
         Returns the number of newly computed embeddings.
         """
         rows = db.execute(
@@ -78,20 +146,27 @@ class EmbeddingService:
         if not rows:
             return 0
 
+        # Two-stage pipeline: the loader threads decode chunk k+1 while the
+        # model runs on chunk k (torch releases the GIL during the forward pass)
+        chunks = [rows[i:i + _ENCODE_BATCH_SIZE] for i in range(0, len(rows), _ENCODE_BATCH_SIZE)]
+        pending = self._submit_loads([row["filepath"] for row in chunks[0]])
         count = 0
-        for row in rows:
-            vec = self.encode_image(row["filepath"])
-            blob = self.vector_to_blob(vec)
-            db.execute(
+        for k, chunk in enumerate(chunks):
+            tensors = [f.result() for f in pending]
+            if k + 1 < len(chunks):
+                pending = self._submit_loads([row["filepath"] for row in chunks[k + 1]])
+
+            vecs = self._encode_tensors(tensors)
+            db.executemany(
                 """
                 INSERT OR REPLACE INTO embeddings (drawing_id, vector_blob, model_name)
-                VALUES (?, ?, 'ViT-B-32/openai')
+                VALUES (?, ?, ?)
                 """,
-                (row["id"], blob),
+                [(row["id"], self.vector_to_blob(vec), self.model_name) for row, vec in zip(chunk, vecs)],
             )
-            count += 1
+            db.commit()   # per chunk: progress survives a crash, /status sees it
+            count += len(chunk)
 
-        db.commit()
         return count
 
     def compute_umap(self, vectors: np.ndarray) -> np.ndarray:
@@ -100,9 +175,20 @@ class EmbeddingService:
         Returns (N, 2) float32 array with coordinates normalized to [0, 1].
         Falls back to PCA if umap-learn is unavailable.
         """
+        if len(vectors) < 2:
+            return np.zeros((len(vectors), 2), dtype=np.float32)
+        _, coords = self.fit_umap(vectors)
+        return self.normalize_coords(coords)
+
+    def fit_umap(self, vectors: np.ndarray):
+        """
+        Fit a 2-D projection on an (N, 512) float32 matrix.
+        Returns (reducer, raw (N, 2) float32 coords); reducer is None for the
+        PCA fallback (umap-learn unavailable) or when N < 2.
+        """
         n = len(vectors)
         if n < 2:
-            return np.zeros((n, 2), dtype=np.float32)
+            return None, np.zeros((n, 2), dtype=np.float32)
 
         try:
             import umap
@@ -113,25 +199,69 @@ class EmbeddingService:
                 n_neighbors=min(15, n - 1),
                 min_dist=0.1,
                 random_state=42,
+                low_memory=True,
             )
             coords = reducer.fit_transform(vectors).astype(np.float32)
+            return reducer, coords
         except ImportError:
-            # Fallback: PCA via numpy SVD
+            # Fallback: PCA. The top-2 axes come from eigh on the D×D scatter
+            # matrix (512×512 regardless of N) instead of a full SVD of N×D.
             print("[Embeddings] umap-learn not available, falling back to PCA")
             centered = vectors - vectors.mean(axis=0)
-            _, _, vh = np.linalg.svd(centered, full_matrices=False)
-            coords = (centered @ vh[:2].T).astype(np.float32)
-
-        # Normalize to [0, 1]
-        for dim in range(2):
-            col = coords[:, dim]
-            lo, hi = col.min(), col.max()
-            if hi > lo:
-                coords[:, dim] = (col - lo) / (hi - lo)
-            else:
-                coords[:, dim] = 0.5
-
-        return coords
+            _, eigvecs = np.linalg.eigh(centered.T @ centered)   # ascending eigenvalues
+            return None, (centered @ eigvecs[:, :-3:-1]).astype(np.float32)
+
+    def project_user(
+        self, user_id: int, vectors: np.ndarray, coords: np.ndarray, missing: np.ndarray
+    ) -> tuple[np.ndarray, bool]:
+        """
+        Fill in raw 2-D coords for rows flagged in `missing` (bool mask over N).
+
+        Uses the user's cached UMAP reducer and transform() on just the new rows.
+        Refits on everything (and re-caches the reducer) when there is no cached
+        model or the row count has grown by more than settings.umap_refit_fraction
+        since that model was fit, so transform() calls can't accumulate drift.
+
+        Returns (coords, refit) — refit=True means every row's coords changed.
+        """
+        from app.config import settings
+
+        model_path = Path(settings.umap_model_dir) / f"{user_id}.joblib"
+
+        if model_path.exists():
+            try:
+                import joblib
+                cached = joblib.load(model_path)   # {"reducer": ..., "n_fit": rows at fit time}
+                n_fit = cached["n_fit"]
+                if len(vectors) - n_fit <= n_fit * settings.umap_refit_fraction:
+                    coords = coords.copy()
+                    coords[missing] = cached["reducer"].transform(vectors[missing]).astype(np.float32)
+                    return coords, False
+            except Exception as e:
+                print(f"[Embeddings] Cached UMAP unusable for user {user_id}, refitting: {e}")
+
+        reducer, coords = self.fit_umap(vectors)
+        if reducer is not None:
+            try:
+                import joblib
+                model_path.parent.mkdir(parents=True, exist_ok=True)
+                joblib.dump({"reducer": reducer, "n_fit": len(vectors)}, model_path)
+            except Exception as e:
+                print(f"[Embeddings] Could not cache UMAP model for user {user_id}: {e}")
+        elif model_path.exists():
+            model_path.unlink()   # stale reducer no longer matches the stored coords
+        return coords, True
+
+    @staticmethod
+    def normalize_coords(coords: np.ndarray) -> np.ndarray:
+        """Scale each column of (N, 2) coords to [0, 1] (constant columns → 0.5)."""
+        coords = coords.astype(np.float32)
+        if len(coords) == 0:
+            return coords
+        lo, hi = coords.min(axis=0), coords.max(axis=0)
+        varies = hi > lo
+        span = np.where(varies, hi - lo, 1.0)
+        return np.where(varies, (coords - lo) / span, 0.5).astype(np.float32)
 
 
 # Module-level singleton (lazy init — avoids loading CLIP on every import)
@@ -0,0 +1,84 @@
+"""StaticFiles variant serving /static from an index built once at startup."""
+
+import os
+import re
+
+import anyio
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+from app.http_cache import etag_matches, not_modified
+
+# Fingerprinted asset names (e.g. app.3f9c2a1b.js) never change content → cache forever
+_FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+
+
+def _cache_control(filename: str) -> str:
+    if _FINGERPRINT_RE.search(filename):
+        return "public, max-age=31536000, immutable"
+    return "no-cache"   # browser revalidates with the ETag → 304
+
+
+def _etag(path: str, stat_result: os.stat_result) -> str:
+    return FileResponse(path, stat_result=stat_result).headers["etag"]
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    Serves assets from an in-memory index of {relpath: (abspath, stat, etag)}:
+    a single stat() in the threadpool revalidates the entry (no path resolution
+    or directory checks), and If-None-Match is answered with a 304 straight from
+    the precomputed ETag.
+
+    Paths missing from the index (e.g. files added while developing) fall back
+    to the regular StaticFiles lookup.
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self._root = str(directory)
+        self._index: dict[str, tuple[str, os.stat_result, str]] = {}
+
+    def build_index(self) -> None:
+        """Walk the static directory once and precompute stat results + ETags."""
+        index = {}
+        stack = [(self._root, "")]
+        while stack:
+            dir_path, rel = stack.pop()
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel, entry.name) if rel else entry.name
+                    if entry.is_dir():
+                        stack.append((entry.path, rel_path))
+                    elif entry.is_file():
+                        stat_result = entry.stat()
+                        etag = _etag(entry.path, stat_result)
+                        index[rel_path] = (entry.path, stat_result, etag)
+        self._index = index
+
+    async def get_response(self, path: str, scope) -> Response:
+        cached = self._index.get(path)
+        if cached is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        full_path, stat_result, etag = cached
+        # One stat() keeps the index honest when assets are edited under --reload
+        # (which only restarts on .py changes): size/mtime drift → refresh entry.
+        # Run in the threadpool, as StaticFiles does, so a slow disk can't block the loop.
+        try:
+            current = await anyio.to_thread.run_sync(os.stat, full_path)
+        except OSError:
+            self._index.pop(path, None)
+            return await super().get_response(path, scope)
+        if (current.st_size, current.st_mtime_ns) != (stat_result.st_size, stat_result.st_mtime_ns):
+            stat_result, etag = current, _etag(full_path, current)
+            self._index[path] = (full_path, stat_result, etag)
+        if etag_matches(Headers(scope=scope).get("if-none-match"), etag):
+            return not_modified(etag, _cache_control(os.path.basename(full_path)))
+        return self.file_response(full_path, stat_result, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["cache-control"] = _cache_control(os.path.basename(full_path))
+        return response